@@ -1,44 +1,197 @@
 from fastapi import FastAPI, HTTPException
-from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import Response
+import asyncio
+import logging
+import orjson
 import os
+import re
+import sys
 from dotenv import load_dotenv
 from contextlib import asynccontextmanager
 
-from routes.api import router as api_router
+from routes.api import router as api_router, drain_background_tasks
 from models.schemas import APIResponse
-from datetime import datetime
+from services.supabase_service import SupabaseService
+from services.webhook_service import WebhookService
+from transaction_risk_model import TransactionRiskModel, WARMUP_TRANSACTIONS
+from utils.helpers import utcnow, tick_clock
 
 # Load environment variables
 load_dotenv()
 
-# Print environment status for debugging
-print(f"🔧 SUPABASE_URL: {'✅ Set' if os.getenv('SUPABASE_URL') else '❌ Missing'}")
-print(f"🔧 SUPABASE_KEY: {'✅ Set' if os.getenv('SUPABASE_KEY') else '❌ Missing'}")
 
-
-@asynccontextmanager
-async def lifespan(app: FastAPI):
-    """Application lifespan manager"""
-    # Startup
-    print("🚀 Transaction Risk Analytics API starting up...")
+def _startup_report() -> str:
+    """Build the startup banner and environment status as one block of text"""
+    lines = [
+        "🚀 Transaction Risk Analytics API starting up...",
+        f"🔧 SUPABASE_URL: {'✅ Set' if os.getenv('SUPABASE_URL') else '❌ Missing'}",
+        f"🔧 SUPABASE_KEY: {'✅ Set' if os.getenv('SUPABASE_KEY') else '❌ Missing'}",
+    ]
     
     # Verify required environment variables
     required_vars = ["SUPABASE_URL", "SUPABASE_KEY"]
     missing_vars = [var for var in required_vars if not os.getenv(var)]
     
     if missing_vars:
-        print(f"❌ Missing required environment variables: {missing_vars}")
-        print("Please set these variables before starting the application")
+        lines.append(f"❌ Missing required environment variables: {missing_vars}")
+        lines.append("Please set these variables before starting the application")
     else:
-        print("✅ All required environment variables are set")
+        lines.append("✅ All required environment variables are set")
     
-    print("✅ Application startup complete")
+    lines.append("✅ Application startup complete")
+    return "\n".join(lines) + "\n"
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application lifespan manager"""
+    # Startup
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s"
+    )
+    # httpx logs every outbound request at INFO
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    
+    # Shared services, created once per process so the HTTP pool is reused
+    app.state.supabase = SupabaseService()
+    app.state.ml_model = TransactionRiskModel()
+    # Run one synthetic analysis so lazy imports and first-call setup happen
+    # here rather than on the first client request
+    app.state.ml_model.analyze_transactions(WARMUP_TRANSACTIONS)
+    # One webhook service (and connection pool) per process
+    app.state.webhook_service = WebhookService()
+    await app.state.webhook_service.start()
+    
+    # Keep a coarse UTC clock for response timestamps
+    clock_task = asyncio.create_task(tick_clock())
+    
+    # One write and flush for the whole startup report
+    sys.stdout.write(_startup_report())
+    sys.stdout.flush()
     
     yield
     
     # Shutdown
     print("🛑 Transaction Risk Analytics API shutting down...")
+    clock_task.cancel()
+    # Let result saves spawned by /api/analyze finish while the client is open
+    await drain_background_tasks()
+    await app.state.supabase.aclose()
+    await app.state.webhook_service.aclose()
+
+
+# Pre-built CORS response pieces shared by every request
+_MAX_AGE = b"600"
+_ALL_METHODS = ("DELETE", "GET", "HEAD", "OPTIONS", "PATCH", "POST", "PUT")
+_PREFLIGHT_BODY = {"type": "http.response.body", "body": b"OK"}
+_DISALLOWED_START = {
+    "type": "http.response.start",
+    "status": 400,
+    "headers": [
+        (b"content-type", b"text/plain; charset=utf-8"),
+        (b"content-length", b"22"),
+    ],
+}
+_DISALLOWED_BODY = {"type": "http.response.body", "body": b"Disallowed CORS origin"}
+
+# Local React dev servers plus Vercel/Netlify deployments (including preview
+# subdomains). Compiled once against bytes so origins never need decoding.
+_ORIGIN_REGEX = re.compile(rb"https://([a-z0-9-]+\.)?(vercel|netlify)\.app|http://localhost:300[01]")
+
+
+class FastCORS:
+    """Pure-ASGI CORS middleware
+
+    Answers preflight requests before they reach FastAPI routing and adds the
+    Access-Control-* headers straight onto the outgoing response start message,
+    so no Starlette Request/Response objects are built per request.
+    """
+
+    def __init__(self, app, allow_origins, allow_methods, allow_headers,
+                 allow_origin_regex=None, allow_credentials=True):
+        self.app = app
+        self.allow_origins = frozenset(origin.encode("latin-1") for origin in allow_origins if origin)
+        # Bound method stored once to skip the attribute lookup per request
+        self._origin_match = allow_origin_regex.fullmatch if allow_origin_regex is not None else None
+        self.allow_all_headers = "*" in allow_headers
+        if "*" in allow_methods:
+            allow_methods = _ALL_METHODS
+
+        # Header values are joined once here and the same list objects are
+        # reused for every response
+        self._allow_headers = ", ".join(allow_headers).encode("latin-1")
+        self._preflight_headers = [
+            (b"access-control-allow-methods", ", ".join(allow_methods).encode("latin-1")),
+            (b"access-control-max-age", _MAX_AGE),
+            (b"vary", b"Origin"),
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", b"2"),
+        ]
+        self._simple_headers = [(b"vary", b"Origin")]
+        if allow_credentials:
+            self._preflight_headers.append((b"access-control-allow-credentials", b"true"))
+            self._simple_headers.append((b"access-control-allow-credentials", b"true"))
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        origin = None
+        request_method = None
+        request_headers = None
+        for name, value in scope["headers"]:
+            if name == b"origin":
+                origin = value
+            elif name == b"access-control-request-method":
+                request_method = value
+            elif name == b"access-control-request-headers":
+                request_headers = value
+
+        if origin is None:
+            await self.app(scope, receive, send)
+            return
+
+        allowed = origin in self.allow_origins or (
+            self._origin_match is not None and self._origin_match(origin) is not None
+        )
+
+        # Preflight: answer directly without touching the application
+        if scope["method"] == "OPTIONS" and request_method is not None:
+            if not allowed:
+                await send(_DISALLOWED_START)
+                await send(_DISALLOWED_BODY)
+                return
+
+            allow_headers = self._allow_headers
+            if self.allow_all_headers and request_headers is not None:
+                allow_headers = request_headers
+
+            headers = [
+                (b"access-control-allow-origin", origin),
+                (b"access-control-allow-headers", allow_headers),
+            ]
+            headers.extend(self._preflight_headers)
+
+            await send({"type": "http.response.start", "status": 200, "headers": headers})
+            await send(_PREFLIGHT_BODY)
+            return
+
+        if not allowed:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_with_cors(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"access-control-allow-origin", origin))
+                headers.extend(self._simple_headers)
+                message["headers"] = headers
+            await send(message)
+
+        await self.app(scope, receive, send_with_cors)
 
 
 # Create FastAPI application
@@ -86,18 +239,19 @@ app = FastAPI(
     lifespan=lifespan
 )
 
+# Compress larger JSON bodies (analysis results are 5-20KB of repetitive keys).
+# Registered before CORS so preflights are answered without passing through it.
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # CORS Configuration
 app.add_middleware(
-    CORSMiddleware,
+    FastCORS,
     allow_origins=[
-        "http://localhost:3000",  # React development
-        "http://localhost:3001",  # Alternative React port
-        "https://*.vercel.app",   # Vercel deployments
-        "https://*.netlify.app",  # Netlify deployments
         os.getenv("FRONTEND_URL", ""),  # Custom frontend URL
     ],
+    allow_origin_regex=_ORIGIN_REGEX,  # React dev ports, Vercel and Netlify deployments
     allow_credentials=True,
-    allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
+    allow_methods=["*"],
     allow_headers=["*"],
 )
 
@@ -105,62 +259,75 @@ app.add_middleware(
 app.include_router(api_router)
 
 
+# The root payload is constant per process: serialize it once at import and
+# only append the per-request timestamp
+_ROOT_BODY_PREFIX = orjson.dumps({
+    "success": True,
+    "data": {
+        "name": "Transaction Risk Scoring & Financial Behavior Analytics API",
+        "version": "1.0.0",
+        "status": "operational",
+        "endpoints": {
+            "analyze": "/api/analyze?account_no=...&ifsc=...",
+            "results": "/api/results/{user_id}",
+            "webhook": "/api/webhook",
+            "health": "/api/health",
+            "docs": "/docs",
+            "redoc": "/redoc"
+        },
+        "features": [
+            "Transaction Risk Analysis",
+            "Financial Behavior Analytics",
+            "Loan Eligibility Assessment",
+            "Real-time Processing",
+            "Webhook Integration",
+            "Supabase Integration"
+        ]
+    },
+    "message": "Transaction Risk Analytics API is running successfully"
+})[:-1] + b',"timestamp":'
+
+
 @app.get("/", response_model=APIResponse)
 async def root():
     """Root endpoint with API information"""
-    return APIResponse(
-        success=True,
-        data={
-            "name": "Transaction Risk Scoring & Financial Behavior Analytics API",
-            "version": "1.0.0",
-            "status": "operational",
-            "endpoints": {
-                "analyze": "/api/analyze?account_no=...&ifsc=...",
-                "results": "/api/results/{user_id}",
-                "webhook": "/api/webhook",
-                "health": "/api/health",
-                "docs": "/docs",
-                "redoc": "/redoc"
-            },
-            "features": [
-                "Transaction Risk Analysis",
-                "Financial Behavior Analytics",
-                "Loan Eligibility Assessment",
-                "Real-time Processing",
-                "Webhook Integration",
-                "Supabase Integration"
-            ]
-        },
-        message="Transaction Risk Analytics API is running successfully",
-        timestamp=datetime.utcnow()
+    return Response(
+        content=_ROOT_BODY_PREFIX + orjson.dumps(utcnow()) + b"}",
+        media_type="application/json"
     )
 
 
+# Error bodies are serialized without building an APIResponse; the 500 body is
+# constant apart from its timestamp
+_500_BODY_PREFIX = orjson.dumps({
+    "success": False,
+    "data": None,
+    "message": "Internal server error occurred"
+})[:-1] + b',"timestamp":'
+
+
 @app.exception_handler(404)
 async def not_found_handler(request, exc):
     """Custom 404 handler"""
-    return JSONResponse(
+    return Response(
+        content=orjson.dumps({
+            "success": False,
+            "data": None,
+            "message": f"Endpoint not found: {request.url.path}",
+            "timestamp": utcnow()
+        }),
         status_code=404,
-        content=APIResponse(
-            success=False,
-            data=None,
-            message=f"Endpoint not found: {request.url.path}",
-            timestamp=datetime.utcnow()
-        ).dict()
+        media_type="application/json"
     )
 
 
 @app.exception_handler(500)
 async def internal_error_handler(request, exc):
     """Custom 500 handler"""
-    return JSONResponse(
+    return Response(
+        content=_500_BODY_PREFIX + orjson.dumps(utcnow()) + b"}",
         status_code=500,
-        content=APIResponse(
-            success=False,
-            data=None,
-            message="Internal server error occurred",
-            timestamp=datetime.utcnow()
-        ).dict()
+        media_type="application/json"
     )
 
 
@@ -171,6 +338,7 @@ if __name__ == "__main__":
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8000))
     debug = os.getenv("DEBUG", "false").lower() == "true"
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
     
     print(f"🌟 Starting Transaction Risk Analytics API on {host}:{port}")
     print(f"📚 API Documentation available at: http://{host}:{port}/docs")
@@ -181,5 +349,8 @@ if __name__ == "__main__":
         host=host,
         port=port,
         reload=debug,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
         log_level="info" if not debug else "debug"
     )
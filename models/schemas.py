@@ -1,8 +1,19 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import Optional, Dict, Any, List
 from datetime import datetime
 from uuid import UUID
 from enum import Enum
+import re
+
+import numpy as np
+import pandas as pd
+
+
+# Module-level alias so the default factory skips the attribute lookup
+_utcnow = datetime.utcnow
+
+# Models are immutable once built; unknown fields from the database are dropped
+_MODEL_CONFIG = ConfigDict(frozen=True, extra="ignore")
 
 
 class TransactionType(str, Enum):
@@ -23,6 +34,8 @@ class SpendingStability(str, Enum):
 
 
 class User(BaseModel):
+    model_config = _MODEL_CONFIG
+
     id: Optional[UUID] = None
     name: str
     account_no: str
@@ -30,6 +43,8 @@ class User(BaseModel):
 
 
 class Transaction(BaseModel):
+    model_config = _MODEL_CONFIG
+
     id: Optional[UUID] = None
     user_id: UUID
     date: datetime
@@ -40,7 +55,90 @@ class Transaction(BaseModel):
     upi_app: Optional[str] = Field(None, alias="UPI_App")
 
 
+# Trailing UTC offset of an ISO-8601 timestamp, e.g. "+05:30", "-0800" or "+05"
+_UTC_OFFSET_RE = re.compile(r"([+-])(\d{2}):?(\d{2})?$")
+
+
+def _utc_offset_seconds(tail: str) -> int:
+    """Seconds of the UTC offset at the end of `tail`, 0 when it has none"""
+    match = _UTC_OFFSET_RE.search(tail)
+    if match is None:
+        return 0
+    sign, hours, minutes = match.groups()
+    seconds = int(hours) * 3600 + int(minutes or 0) * 60
+    return -seconds if sign == "-" else seconds
+
+
+def _utc_offsets(values: List[Any]) -> np.ndarray:
+    """UTC offset in seconds of each timestamp (0 for naive and 'Z' values)"""
+    offsets = np.zeros(len(values), dtype=np.int64)
+    # A user's rows share a handful of offsets, so each distinct tail is parsed once
+    by_tail: Dict[str, int] = {}
+    for i, value in enumerate(values):
+        if isinstance(value, str):
+            # Only the part after the 10-character date can hold an offset
+            tail = value[-6:] if len(value) > 10 else ""
+            offset = by_tail.get(tail)
+            if offset is None:
+                offset = by_tail[tail] = _utc_offset_seconds(tail)
+        else:
+            # datetime objects carry their own offset
+            delta = value.utcoffset()
+            offset = int(delta.total_seconds()) if delta is not None else 0
+        offsets[i] = offset
+    return offsets
+
+
+class Transactions:
+    """Struct-of-arrays view of a user's transactions for the analysis pipeline
+
+    Holds one contiguous numpy array per field instead of one model per row:
+    `dates` as int64 seconds of each row's local wall-clock time (unix
+    seconds plus the row's UTC offset), `amounts` as float64, `is_credit` as uint8
+    and `category_codes` as int32 indexes into `categories` (-1 when missing).
+    """
+    __slots__ = ("dates", "amounts", "is_credit", "category_codes", "categories")
+
+    def __init__(self, dates: np.ndarray, amounts: np.ndarray, is_credit: np.ndarray,
+                 category_codes: np.ndarray, categories: List[str]):
+        self.dates = dates
+        self.amounts = amounts
+        self.is_credit = is_credit
+        self.category_codes = category_codes
+        self.categories = categories
+
+    def __len__(self) -> int:
+        return len(self.amounts)
+
+    @classmethod
+    def from_rows(cls, rows: List[Dict[str, Any]]) -> "Transactions":
+        """Build the column arrays from raw transaction rows"""
+        n = len(rows)
+        amounts = np.fromiter((row["amount"] for row in rows), dtype=np.float64, count=n)
+        is_credit = np.fromiter((row["type"] == "credit" for row in rows), dtype=np.uint8, count=n)
+
+        # Vectorized ISO-8601 parsing to unix seconds, then shifted by each
+        # row's own UTC offset so weekdays and months follow its wall clock
+        raw_dates = [row["date"] for row in rows]
+        dates = pd.to_datetime(raw_dates, utc=True, format="ISO8601")
+        dates = dates.as_unit("s").asi8 + _utc_offsets(raw_dates)
+
+        category_codes, categories = pd.factorize(
+            pd.Series([row["category"] for row in rows], dtype=object).str.lower(), sort=True
+        )
+
+        return cls(
+            dates=dates,
+            amounts=amounts,
+            is_credit=is_credit,
+            category_codes=category_codes.astype(np.int32),
+            categories=list(categories),
+        )
+
+
 class FinancialSummary(BaseModel):
+    model_config = _MODEL_CONFIG
+
     monthly_spendings: Dict[str, float]
     monthly_savings: Dict[str, float]
     total_savings: float
@@ -51,12 +149,16 @@ class FinancialSummary(BaseModel):
 
 
 class BehavioralPatterns(BaseModel):
+    model_config = _MODEL_CONFIG
+
     essential_spending_ratio: float
     high_risk_spending_ratio: float
     weekend_spending_ratio: float
 
 
 class BehavioralAnalysis(BaseModel):
+    model_config = _MODEL_CONFIG
+
     spending_pattern_distribution: Dict[str, float]
     income_and_spending_analysis: Dict[str, Any]
     spending_stability: SpendingStability
@@ -64,6 +166,8 @@ class BehavioralAnalysis(BaseModel):
 
 
 class RiskAssessmentDetails(BaseModel):
+    model_config = _MODEL_CONFIG
+
     risk_essential_spending: float
     high_risk_spending: float
     weekend_spending: float
@@ -71,6 +175,8 @@ class RiskAssessmentDetails(BaseModel):
 
 
 class MLAnalysisResult(BaseModel):
+    model_config = _MODEL_CONFIG
+
     overall_risk_score: float
     risk_category: RiskCategory
     loan_eligibility: bool
@@ -82,6 +188,8 @@ class MLAnalysisResult(BaseModel):
 
 
 class MLResult(BaseModel):
+    model_config = _MODEL_CONFIG
+
     id: Optional[UUID] = None
     user_id: UUID
     risk_score: float
@@ -93,18 +201,31 @@ class MLResult(BaseModel):
 
 
 class AnalyzeRequest(BaseModel):
+    model_config = _MODEL_CONFIG
+
     account_no: str
     ifsc_code: str
 
 
 class WebhookPayload(BaseModel):
+    model_config = _MODEL_CONFIG
+
     user_id: UUID
     analysis_result: MLAnalysisResult
     timestamp: datetime
 
 
 class APIResponse(BaseModel):
+    model_config = _MODEL_CONFIG
+
     success: bool
     data: Optional[Any] = None
     message: Optional[str] = None
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    timestamp: datetime = Field(default_factory=_utcnow)
+
+
+# Resolve every model's core schema at import rather than on first use
+for _model in (User, Transaction, FinancialSummary, BehavioralPatterns, BehavioralAnalysis,
+               RiskAssessmentDetails, MLAnalysisResult, MLResult, AnalyzeRequest,
+               WebhookPayload, APIResponse):
+    _model.model_rebuild()
@@ -1,26 +1,61 @@
-from fastapi import APIRouter, HTTPException, Depends, Query
-from typing import Optional
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Response
+from typing import Optional, Any
 from uuid import UUID
-import httpx
+import asyncio
+import logging
+import orjson
 import os
-from datetime import datetime
 
 from models.schemas import (
-    APIResponse, MLAnalysisResult, AnalyzeRequest, 
-    WebhookPayload, MLResult
+    APIResponse, MLAnalysisResult, AnalyzeRequest, MLResult
 )
 from services.supabase_service import SupabaseService
+from services.webhook_service import WebhookService
 from transaction_risk_model import TransactionRiskModel
+from utils.helpers import utcnow
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api", tags=["analytics"])
 
-# Dependency to get Supabase service
-def get_supabase_service() -> SupabaseService:
-    return SupabaseService()
+# Results only change when /api/analyze runs, so let browsers and edge caches
+# reuse them briefly
+_RESULTS_CACHE_CONTROL = "public, max-age=60, stale-while-revalidate=300"
+
+# Strong references to fire-and-forget tasks so they aren't garbage collected
+_background_tasks = set()
+# How long shutdown waits for those tasks (result saves) to finish, in seconds
+BACKGROUND_DRAIN_TIMEOUT = 10.0
+
+def _json_response(data: Any, message: str, success: bool = True) -> Response:
+    """Serialize an APIResponse-shaped body in one orjson pass, skipping model validation"""
+    return Response(
+        content=orjson.dumps({
+            "success": success,
+            "data": data,
+            "message": message,
+            "timestamp": utcnow()
+        }),
+        media_type="application/json"
+    )
+
+
+def _strip_weak(tag: str) -> str:
+    """Drop the W/ prefix of a weak entity tag"""
+    return tag[2:] if tag.startswith("W/") else tag
 
-# Dependency to get ML model
-def get_ml_model() -> TransactionRiskModel:
-    return TransactionRiskModel()
+
+# Dependency to get the shared Supabase service (created in app lifespan)
+def get_supabase_service(request: Request) -> SupabaseService:
+    return request.app.state.supabase
+
+# Dependency to get the shared ML model (created in app lifespan)
+def get_ml_model(request: Request) -> TransactionRiskModel:
+    return request.app.state.ml_model
+
+# Dependency to get the shared webhook service (created in app lifespan)
+def get_webhook_service(request: Request) -> WebhookService:
+    return request.app.state.webhook_service
 
 
 @router.get("/analyze", response_model=APIResponse)
@@ -28,31 +63,29 @@ async def analyze_transactions(
     account_no: str = Query(..., description="Account number"),
     ifsc: str = Query(..., description="IFSC code"),
     supabase: SupabaseService = Depends(get_supabase_service),
-    ml_model: TransactionRiskModel = Depends(get_ml_model)
+    ml_model: TransactionRiskModel = Depends(get_ml_model),
+    webhook_service: WebhookService = Depends(get_webhook_service)
 ):
     """
     Analyze user transactions and generate risk assessment
     
     This endpoint:
-    1. Fetches user by account_no and ifsc_code
-    2. Retrieves 180 days of transaction history
-    3. Runs ML analysis to generate risk metrics
-    4. Saves results to database
-    5. Optionally sends webhook to external service
-    6. Returns comprehensive analysis results
+    1. Fetches the user by account_no and ifsc_code together with
+       180 days of transaction history in a single round-trip
+    2. Runs ML analysis to generate risk metrics
+    3. Saves results to database in the background
+    4. Optionally queues a webhook to an external service
+    5. Returns comprehensive analysis results
     """
     try:
-        # Get user by account details
-        user = await supabase.get_user_by_account(account_no, ifsc)
+        # Get user and their transactions (last 180 days)
+        user, transactions = await supabase.get_analysis_bundle(account_no, ifsc, days=180)
         if not user:
             raise HTTPException(
                 status_code=404, 
                 detail=f"User not found with account_no: {account_no} and ifsc: {ifsc}"
             )
         
-        # Get user transactions (last 180 days)
-        transactions = await supabase.get_user_transactions(user.id, days=180)
-        
         if not transactions:
             raise HTTPException(
                 status_code=404,
@@ -62,34 +95,23 @@ async def analyze_transactions(
         # Run ML analysis
         analysis_result = ml_model.analyze_transactions(transactions)
         
-        # Save results to database
-        ml_result = await supabase.save_ml_result(user.id, analysis_result)
-        if not ml_result:
-            raise HTTPException(
-                status_code=500,
-                detail="Failed to save analysis results to database"
-            )
+        # Save results to database without holding up the response
+        _spawn(_save_result(supabase, user.id, analysis_result))
         
-        # Send webhook if configured
+        # Queue webhook if configured; workers deliver it after the response
         webhook_url = os.getenv("WEBHOOK_URL")
         if webhook_url:
-            try:
-                await send_webhook(user.id, analysis_result, webhook_url)
-            except Exception as e:
-                print(f"Webhook failed: {e}")
-                # Don't fail the main request if webhook fails
+            await webhook_service.enqueue(webhook_url, user.id, analysis_result)
         
-        return APIResponse(
-            success=True,
-            data=analysis_result.dict(),
-            message=f"Analysis completed successfully for user {user.name}",
-            timestamp=datetime.utcnow()
+        return _json_response(
+            analysis_result.model_dump(),
+            f"Analysis completed successfully for user {user.name}"
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Analysis error: {e}")
+        logger.exception("Analysis error")
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error during analysis: {str(e)}"
@@ -99,6 +121,7 @@ async def analyze_transactions(
 @router.get("/results/{user_id}", response_model=APIResponse)
 async def get_user_results(
     user_id: UUID,
+    request: Request,
     supabase: SupabaseService = Depends(get_supabase_service)
 ):
     """
@@ -108,26 +131,46 @@ async def get_user_results(
     like the Agentic AI recommender system.
     """
     try:
-        # Get latest ML result for user
-        ml_result = await supabase.get_latest_ml_result(user_id)
+        # Serve the serialized result from cache until it expires or is replaced
+        cached = supabase.get_cached_result(user_id)
         
-        if not ml_result:
-            raise HTTPException(
-                status_code=404,
-                detail=f"No analysis results found for user {user_id}"
-            )
+        if cached is None:
+            # Get latest ML result for user
+            ml_result = await supabase.get_latest_ml_result(user_id)
+            
+            if not ml_result:
+                raise HTTPException(
+                    status_code=404,
+                    detail=f"No analysis results found for user {user_id}"
+                )
+            
+            cached = supabase.cache_result(user_id, ml_result)
         
-        return APIResponse(
-            success=True,
-            data=ml_result.dict(),
-            message="Latest analysis results retrieved successfully",
-            timestamp=datetime.utcnow()
-        )
+        # Each encoding is its own representation with its own tag, and every
+        # response varies on Accept-Encoding so shared caches keep them apart
+        use_gzip = cached.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", "")
+        etag = cached.gzip_etag if use_gzip else cached.etag
+        headers = {"Cache-Control": _RESULTS_CACHE_CONTROL, "ETag": etag, "Vary": "Accept-Encoding"}
+        
+        # Conditional request for the version the client already has
+        if_none_match = request.headers.get("if-none-match")
+        # Weak comparison (RFC 9110 13.1.2): W/ prefixes are ignored on both sides
+        if if_none_match and _strip_weak(etag) in [_strip_weak(tag.strip()) for tag in if_none_match.split(",")]:
+            return Response(status_code=304, headers=headers)
+        
+        # Hand out the precompressed body so cache hits skip GZipMiddleware
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(content=cached.gzip_body, media_type="application/json", headers=headers)
+        if cached.gzip_body is not None:
+            # GZipMiddleware adds its own Vary to bodies this large
+            del headers["Vary"]
+        return Response(content=cached.body, media_type="application/json", headers=headers)
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Results retrieval error: {e}")
+        logger.exception("Results retrieval error")
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error retrieving results: {str(e)}"
@@ -138,7 +181,8 @@ async def get_user_results(
 async def trigger_webhook(
     user_id: UUID,
     webhook_url: str,
-    supabase: SupabaseService = Depends(get_supabase_service)
+    supabase: SupabaseService = Depends(get_supabase_service),
+    webhook_service: WebhookService = Depends(get_webhook_service)
 ):
     """
     Manually trigger webhook for a user's latest analysis results
@@ -159,20 +203,24 @@ async def trigger_webhook(
         # Convert MLResult back to MLAnalysisResult for webhook
         analysis_result = MLAnalysisResult(**ml_result.metrics)
         
-        # Send webhook
-        await send_webhook(user_id, analysis_result, webhook_url)
+        # Send webhook (the service retries and logs failures itself)
+        if not await webhook_service.send_webhook(webhook_url, user_id, analysis_result):
+            raise HTTPException(
+                status_code=502,
+                detail=f"Failed to send webhook to {webhook_url}"
+            )
         
         return APIResponse(
             success=True,
             data={"webhook_url": webhook_url, "user_id": str(user_id)},
             message="Webhook sent successfully",
-            timestamp=datetime.utcnow()
+            timestamp=utcnow()
         )
         
     except HTTPException:
         raise
     except Exception as e:
-        print(f"Webhook trigger error: {e}")
+        logger.exception("Webhook trigger error")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to send webhook: {str(e)}"
@@ -182,15 +230,13 @@ async def trigger_webhook(
 @router.get("/test", response_model=APIResponse)
 async def test_endpoint():
     """Simple test endpoint that doesn't require database"""
-    return APIResponse(
-        success=True,
-        data={
+    return _json_response(
+        {
             "message": "API is working",
-            "timestamp": datetime.utcnow().isoformat(),
+            "timestamp": utcnow().isoformat(),
             "version": "1.0.0"
         },
-        message="Test endpoint working successfully",
-        timestamp=datetime.utcnow()
+        "Test endpoint working successfully"
     )
 
 
@@ -203,45 +249,51 @@ async def health_check(
         # Check Supabase connection
         supabase_healthy = await supabase.health_check()
         
-        return APIResponse(
-            success=True,
-            data={
+        return _json_response(
+            {
                 "status": "healthy",
                 "supabase": "connected" if supabase_healthy else "disconnected",
                 "ml_model": "ready",
                 "supabase_status": supabase_healthy
             },
-            message="Service is running" + (" with Supabase" if supabase_healthy else " without Supabase"),
-            timestamp=datetime.utcnow()
+            "Service is running" + (" with Supabase" if supabase_healthy else " without Supabase")
         )
         
     except Exception as e:
-        print(f"Health check error: {e}")
-        return APIResponse(
-            success=False,
-            data={
+        logger.exception("Health check error")
+        return _json_response(
+            {
                 "status": "unhealthy",
                 "error": str(e)
             },
-            message=f"Health check failed: {str(e)}",
-            timestamp=datetime.utcnow()
+            f"Health check failed: {str(e)}",
+            success=False
         )
 
 
-async def send_webhook(user_id: UUID, analysis_result: MLAnalysisResult, webhook_url: str):
-    """Send analysis results to external webhook URL"""
-    webhook_payload = WebhookPayload(
-        user_id=user_id,
-        analysis_result=analysis_result,
-        timestamp=datetime.utcnow()
-    )
-    
-    async with httpx.AsyncClient(timeout=30.0) as client:
-        response = await client.post(
-            webhook_url,
-            json=webhook_payload.dict(),
-            headers={"Content-Type": "application/json"}
-        )
-        response.raise_for_status()
-        
-    print(f"Webhook sent successfully to {webhook_url} for user {user_id}")
+def _spawn(coro):
+    """Run a coroutine in the background, keeping a reference until it finishes"""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+
+async def drain_background_tasks(timeout: float = BACKGROUND_DRAIN_TIMEOUT):
+    """Wait for in-flight background tasks at shutdown, cancelling any that overrun"""
+    if not _background_tasks:
+        return
+    _, pending = await asyncio.wait(set(_background_tasks), timeout=timeout)
+    if pending:
+        logger.warning("Shutting down with %d background saves still running", len(pending))
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _save_result(supabase: SupabaseService, user_id: UUID, analysis_result: MLAnalysisResult):
+    """Persist an analysis result, reporting failures since no caller awaits it"""
+    ml_result = await supabase.save_ml_result(user_id, analysis_result)
+    if not ml_result:
+        logger.error("Failed to save analysis results to database for user %s", user_id)
+
@@ -1,75 +1,161 @@
+import gzip
+import hashlib
+import logging
 import os
-from typing import List, Optional, Dict, Any
-from supabase import create_client, Client
+import time
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, Tuple, NamedTuple
 from datetime import datetime, timedelta
 from uuid import UUID
-import json
 
-from models.schemas import User, Transaction, MLResult, MLAnalysisResult
+import httpx
+import orjson
+
+from models.schemas import User, MLResult, MLAnalysisResult, APIResponse
+from utils.helpers import serialize_datetime, utcnow
+
+logger = logging.getLogger(__name__)
+
+# Serialized latest-result cache: entries expire after RESULT_CACHE_TTL seconds
+# and the least recently stored entry is evicted past RESULT_CACHE_MAX_ENTRIES
+RESULT_CACHE_TTL = 60.0
+RESULT_CACHE_MAX_ENTRIES = 10_000
+# Bodies at least this large are also stored gzipped (matches GZipMiddleware)
+RESULT_CACHE_GZIP_MIN_SIZE = 1024
+
+
+class CachedResult(NamedTuple):
+    """Serialized /api/results response body, with a gzipped copy when worthwhile"""
+    stored_at: float
+    body: bytes
+    gzip_body: Optional[bytes]
+    etag: str
+    gzip_etag: Optional[str]  # distinct tag for the gzipped representation
 
 
 class SupabaseService:
     def __init__(self):
+        self._result_cache: "OrderedDict[UUID, CachedResult]" = OrderedDict()
         self.url = os.getenv("SUPABASE_URL")
         self.key = os.getenv("SUPABASE_KEY")
         if not self.url or not self.key:
-            print("⚠️  Warning: SUPABASE_URL and SUPABASE_KEY not found in environment")
+            logger.warning("SUPABASE_URL and SUPABASE_KEY not found in environment")
             self.client = None
             return
-        
+
         try:
-            self.client: Client = create_client(self.url, self.key)
-            print("✅ Supabase client initialized successfully")
-        except Exception as e:
-            print(f"❌ Failed to initialize Supabase client: {e}")
+            # Talk to PostgREST directly over one pooled async client so
+            # requests never block the event loop
+            self.client = httpx.AsyncClient(
+                base_url=f"{self.url.rstrip('/')}/rest/v1",
+                headers={
+                    "apikey": self.key,
+                    "Authorization": f"Bearer {self.key}",
+                },
+                http2=True,
+                timeout=10.0,
+                limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+            )
+            logger.info("Supabase client initialized")
+        except Exception:
+            logger.exception("Failed to initialize Supabase client")
             self.client = None
 
+    async def aclose(self):
+        """Close the underlying HTTP connection pool"""
+        if self.client:
+            await self.client.aclose()
+
     async def get_user_by_account(self, account_no: str, ifsc_code: str) -> Optional[User]:
         """Get user by account number and IFSC code"""
         if not self.client:
-            print("❌ Supabase client not initialized")
+            logger.warning("Supabase client not initialized")
             return None
-            
+
         try:
-            response = self.client.table("users").select("*").eq("account_no", account_no).eq("ifsc_code", ifsc_code).execute()
-            
-            if response.data:
-                return User(**response.data[0])
+            response = await self.client.get("/users", params={
+                "select": "*",
+                "account_no": f"eq.{account_no}",
+                "ifsc_code": f"eq.{ifsc_code}",
+                "limit": "1",
+            })
+            response.raise_for_status()
+            data = response.json()
+
+            if data:
+                return User(**data[0])
             return None
-        except Exception as e:
-            print(f"Error fetching user: {e}")
+        except Exception:
+            logger.exception("Error fetching user")
             return None
 
-    async def get_user_transactions(self, user_id: UUID, days: int = 180) -> List[Transaction]:
-        """Get user transactions for the last N days"""
+    async def get_user_transactions(self, user_id: UUID, days: int = 180) -> List[Dict[str, Any]]:
+        """Get raw transaction rows for the last N days
+
+        Rows are returned as parsed JSON without per-row model validation;
+        TransactionRiskModel consumes them directly.
+        """
         if not self.client:
-            print("❌ Supabase client not initialized")
+            logger.warning("Supabase client not initialized")
             return []
-            
+
         try:
             cutoff_date = datetime.utcnow() - timedelta(days=days)
-            
-            response = self.client.table("transactions").select("*").eq("user_id", str(user_id)).gte("date", cutoff_date.isoformat()).execute()
-            
-            transactions = []
-            for transaction_data in response.data:
-                # Convert string date to datetime if needed
-                if isinstance(transaction_data['date'], str):
-                    transaction_data['date'] = datetime.fromisoformat(transaction_data['date'].replace('Z', '+00:00'))
-                
-                transactions.append(Transaction(**transaction_data))
-            
-            return transactions
-        except Exception as e:
-            print(f"Error fetching transactions: {e}")
+
+            response = await self.client.get("/transactions", params={
+                "select": "*",
+                "user_id": f"eq.{user_id}",
+                "date": f"gte.{cutoff_date.isoformat()}",
+            })
+            response.raise_for_status()
+
+            return orjson.loads(response.content)
+        except Exception:
+            logger.exception("Error fetching transactions")
             return []
 
+    async def get_analysis_bundle(self, account_no: str, ifsc_code: str,
+                                  days: int = 180) -> Tuple[Optional[User], List[Dict[str, Any]]]:
+        """Get a user and their last N days of transactions in one round-trip
+
+        Calls the `analyze_bundle` Postgres function (see README). Falls back to
+        separate user and transaction queries if the function isn't deployed.
+        """
+        if not self.client:
+            logger.warning("Supabase client not initialized")
+            return None, []
+
+        try:
+            cutoff_date = datetime.utcnow() - timedelta(days=days)
+
+            response = await self.client.post("/rpc/analyze_bundle", json={
+                "p_account_no": account_no,
+                "p_ifsc": ifsc_code,
+                "p_cutoff": cutoff_date.isoformat(),
+            })
+            if response.status_code == 404:
+                logger.warning("analyze_bundle function not found, falling back to separate queries")
+                user = await self.get_user_by_account(account_no, ifsc_code)
+                if not user:
+                    return None, []
+                return user, await self.get_user_transactions(user.id, days=days)
+
+            response.raise_for_status()
+            bundle = orjson.loads(response.content)
+
+            if not bundle or not bundle.get("user"):
+                return None, []
+            return User(**bundle["user"]), bundle.get("transactions") or []
+        except Exception:
+            logger.exception("Error fetching analysis bundle")
+            return None, []
+
     async def save_ml_result(self, user_id: UUID, analysis_result: MLAnalysisResult) -> Optional[MLResult]:
         """Save ML analysis result to database"""
         if not self.client:
-            print("❌ Supabase client not initialized")
+            logger.warning("Supabase client not initialized")
             return None
-            
+
         try:
             ml_result_data = {
                 "user_id": str(user_id),
@@ -77,73 +163,135 @@ class SupabaseService:
                 "risk_category": analysis_result.risk_category.value,
                 "eligible": analysis_result.loan_eligibility,
                 "eligibility_reason": analysis_result.eligibility_reason,
-                "metrics": analysis_result.dict(),
+                "metrics": analysis_result.model_dump(),
                 "created_at": datetime.utcnow().isoformat()
             }
-            
-            response = self.client.table("ml_results").insert(ml_result_data).execute()
-            
-            if response.data:
-                return MLResult(**response.data[0])
+
+            response = await self.client.post(
+                "/ml_results",
+                # orjson handles datetime/UUID/NumPy scalars in C; serialize_datetime
+                # only sees anything it doesn't know
+                content=orjson.dumps(ml_result_data, default=serialize_datetime, option=orjson.OPT_SERIALIZE_NUMPY),
+                headers={"Content-Type": "application/json", "Prefer": "return=representation"},
+            )
+            response.raise_for_status()
+            data = response.json()
+
+            if data:
+                ml_result = MLResult(**data[0])
+                # The new row is now the latest result for this user
+                self.cache_result(user_id, ml_result)
+                return ml_result
             return None
-        except Exception as e:
-            print(f"Error saving ML result: {e}")
+        except Exception:
+            logger.exception("Error saving ML result")
             return None
 
     async def get_latest_ml_result(self, user_id: UUID) -> Optional[MLResult]:
         """Get the latest ML result for a user"""
         if not self.client:
-            print("❌ Supabase client not initialized")
+            logger.warning("Supabase client not initialized")
             return None
-            
+
         try:
-            response = self.client.table("ml_results").select("*").eq("user_id", str(user_id)).order("created_at", desc=True).limit(1).execute()
-            
-            if response.data:
-                result_data = response.data[0]
-                # Convert string dates to datetime if needed
-                if isinstance(result_data['created_at'], str):
-                    result_data['created_at'] = datetime.fromisoformat(result_data['created_at'].replace('Z', '+00:00'))
-                
-                return MLResult(**result_data)
+            response = await self.client.get("/ml_results", params={
+                "select": "*",
+                "user_id": f"eq.{user_id}",
+                "order": "created_at.desc",
+                "limit": "1",
+            })
+            response.raise_for_status()
+            data = response.json()
+
+            if data:
+                # Pydantic parses the ISO created_at string (including a Z suffix) itself
+                return MLResult(**data[0])
             return None
-        except Exception as e:
-            print(f"Error fetching latest ML result: {e}")
+        except Exception:
+            logger.exception("Error fetching latest ML result")
             return None
 
+    def get_cached_result(self, user_id: UUID) -> Optional[CachedResult]:
+        """Get the cached latest-result response for a user if still fresh"""
+        cached = self._result_cache.get(user_id)
+        if cached is None:
+            return None
+        if time.monotonic() - cached.stored_at >= RESULT_CACHE_TTL:
+            del self._result_cache[user_id]
+            return None
+        return cached
+
+    def cache_result(self, user_id: UUID, ml_result: MLResult) -> CachedResult:
+        """Serialize, compress and cache the latest-result response for a user
+
+        The body is a complete APIResponse so cache hits are served as-is;
+        its timestamp is the time the entry was stored.
+        """
+        body = orjson.dumps(APIResponse(
+            success=True,
+            data=ml_result,
+            message="Latest analysis results retrieved successfully",
+            timestamp=utcnow()
+        ).model_dump())
+        gzip_body = None
+        if len(body) >= RESULT_CACHE_GZIP_MIN_SIZE:
+            gzip_body = gzip.compress(body, compresslevel=5)
+
+        # The result only changes when a new row (new created_at) is written.
+        # The tags are weak: the body's APIResponse timestamp differs each time
+        # the entry is refilled, so the bytes aren't stable under one tag
+        etag_source = ml_result.created_at.isoformat().encode() if ml_result.created_at else body
+        digest = hashlib.blake2b(etag_source, digest_size=8).hexdigest()
+        etag = f'W/"{digest}"'
+        gzip_etag = f'W/"{digest}-gz"' if gzip_body is not None else None
+
+        cached = CachedResult(time.monotonic(), body, gzip_body, etag, gzip_etag)
+        self._result_cache[user_id] = cached
+        self._result_cache.move_to_end(user_id)
+        if len(self._result_cache) > RESULT_CACHE_MAX_ENTRIES:
+            self._result_cache.popitem(last=False)
+        return cached
+
     async def create_user(self, name: str, account_no: str, ifsc_code: str) -> Optional[User]:
         """Create a new user"""
         if not self.client:
-            print("❌ Supabase client not initialized")
+            logger.warning("Supabase client not initialized")
             return None
-            
+
         try:
             user_data = {
                 "name": name,
                 "account_no": account_no,
                 "ifsc_code": ifsc_code
             }
-            
-            response = self.client.table("users").insert(user_data).execute()
-            
-            if response.data:
-                return User(**response.data[0])
+
+            response = await self.client.post(
+                "/users",
+                json=user_data,
+                headers={"Prefer": "return=representation"},
+            )
+            response.raise_for_status()
+            data = response.json()
+
+            if data:
+                return User(**data[0])
             return None
-        except Exception as e:
-            print(f"Error creating user: {e}")
+        except Exception:
+            logger.exception("Error creating user")
             return None
 
     async def health_check(self) -> bool:
         """Check if Supabase connection is healthy"""
         if not self.client:
-            print("❌ Supabase client not initialized")
+            logger.warning("Supabase client not initialized")
             return False
-            
+
         try:
             # Simple test query that doesn't require specific tables
-            response = self.client.rpc('version').execute()
-            print("✅ Supabase connection healthy")
+            response = await self.client.post("/rpc/version")
+            response.raise_for_status()
+            logger.debug("Supabase connection healthy")
             return True
-        except Exception as e:
-            print(f"❌ Supabase health check failed: {e}")
+        except Exception:
+            logger.warning("Supabase health check failed", exc_info=True)
             return False
@@ -1,19 +1,183 @@
 import httpx
 import asyncio
-from typing import Dict, Any, Optional
-from datetime import datetime
-import json
+import hashlib
+import hmac
+import logging
+import orjson
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timezone
 import os
+import random
+import time
+from collections import OrderedDict
 
-from models.schemas import WebhookPayload, MLAnalysisResult
+from models.schemas import (
+    WebhookPayload, MLAnalysisResult, FinancialSummary, BehavioralAnalysis,
+    BehavioralPatterns, RiskAssessmentDetails, RiskCategory, SpendingStability
+)
 from uuid import UUID
 
+logger = logging.getLogger(__name__)
+
+# How long a validate_webhook_url result is reused, in seconds, and how many
+# URLs are remembered (least recently used dropped first)
+VALIDATION_CACHE_TTL = 300.0
+WEBHOOK_MAX_VALIDATIONS = 1024
+# Queued webhooks waiting for a worker, and how long shutdown waits to drain them
+WEBHOOK_QUEUE_MAX_SIZE = 10_000
+WEBHOOK_DRAIN_TIMEOUT = 10.0
+# Per-host rate limiters kept; the least recently used host is dropped past this
+WEBHOOK_MAX_LIMITERS = 1024
+
+# Constant analysis result behind create_test_payload, validated once at import
+_TEMPLATE_RESULT = MLAnalysisResult(
+    overall_risk_score=45.5,
+    risk_category=RiskCategory.MEDIUM,
+    loan_eligibility=True,
+    eligibility_reason="Test eligibility assessment",
+    financial_summary=FinancialSummary(
+        monthly_spendings={"2024-01": 5000.0, "2024-02": 4800.0},
+        monthly_savings={"2024-01": 2000.0, "2024-02": 2200.0},
+        total_savings=4200.0,
+        income_volatility=0.15,
+        spending_volatility=0.20,
+        consistency_score=0.85,
+        transaction_frequency=120
+    ),
+    behavioral_analysis=BehavioralAnalysis(
+        spending_pattern_distribution={"groceries": 0.3, "utilities": 0.2, "entertainment": 0.1},
+        income_and_spending_analysis={"2024-01": {"income": 7000.0, "spending": 5000.0, "savings_rate": 0.29}},
+        spending_stability=SpendingStability.HIGH,
+        behavioral_patterns=BehavioralPatterns(
+            essential_spending_ratio=0.65,
+            high_risk_spending_ratio=0.08,
+            weekend_spending_ratio=0.25
+        )
+    ),
+    risk_assessment_details=RiskAssessmentDetails(
+        risk_essential_spending=20.5,
+        high_risk_spending=8.0,
+        weekend_spending=12.5,
+        loan_eligibility_factors=["Stable income", "Low risk spending"]
+    ),
+    created_at=datetime.now(timezone.utc)
+)
+
+
+class _TokenBucket:
+    """Async token bucket allowing `rate` sends per second with bursts of up to `rate`"""
+    
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = rate
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    async def acquire(self):
+        """Wait until a token is available, then take it"""
+        # Waiters queue on the lock, so tokens are handed out in arrival order
+        async with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self.tokens = 1.0
+                self.updated = time.monotonic()
+            self.tokens -= 1
+
 
 class WebhookService:
     def __init__(self):
         self.timeout = 30.0
         self.max_retries = 3
         self.retry_delay = 1.0  # seconds
+        self.max_retry_delay = 30.0  # seconds
+        # Static headers shared by every send; per-call headers are layered on a copy
+        self._base_headers = {
+            "Content-Type": "application/json",
+            "User-Agent": "TransactionRiskAnalytics/1.0",
+            "X-Webhook-Source": "transaction-risk-api"
+        }
+        secret = os.getenv("WEBHOOK_SECRET")
+        self._secret = secret.encode() if secret else None
+        # Pool sizing: the fanout semaphore must not exceed max_connections,
+        # otherwise sends it admits queue on the pool and can hit PoolTimeout
+        self.max_connections = int(os.getenv("WEBHOOK_MAX_CONN", "100"))
+        self.concurrency = int(os.getenv("WEBHOOK_CONCURRENCY", "32"))
+        if self.concurrency > self.max_connections:
+            logger.warning("WEBHOOK_CONCURRENCY (%d) exceeds WEBHOOK_MAX_CONN (%d); capping it",
+                           self.concurrency, self.max_connections)
+            self.concurrency = self.max_connections
+        self._sem: Optional[asyncio.Semaphore] = None
+        self._validation_cache: "OrderedDict[str, Tuple[float, bool]]" = OrderedDict()
+        # Per-host send rate, shared by all tasks and retries (0 disables it)
+        self.rate_limit = float(os.getenv("WEBHOOK_RPS", "20"))
+        self._limiters: "OrderedDict[str, _TokenBucket]" = OrderedDict()
+        # Background delivery: handlers enqueue, start() spins up the workers
+        self.num_workers = int(os.getenv("WEBHOOK_WORKERS", "4"))
+        self._queue: "asyncio.Queue[Tuple[str, UUID, MLAnalysisResult]]" = asyncio.Queue(
+            maxsize=WEBHOOK_QUEUE_MAX_SIZE
+        )
+        self._workers: List[asyncio.Task] = []
+        # Shared HTTP client, created in start() once an event loop is running
+        self._client: Optional[httpx.AsyncClient] = None
+        
+    async def start(self):
+        """Create the shared HTTP client and start the queue workers"""
+        # One client for every send and retry so keep-alive connections are reused.
+        # HTTP/2 lets sends to the same host share one connection. The transport
+        # retries failed connects itself; send_webhook only retries on
+        # HTTP-level failures.
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(connect=5.0, read=self.timeout, write=5.0, pool=5.0),
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                retries=1,
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=int(os.getenv("WEBHOOK_MAX_KEEPALIVE", "20")),
+                    keepalive_expiry=float(os.getenv("WEBHOOK_KEEPALIVE_EXPIRY", "60"))
+                )
+            )
+        )
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.num_workers)]
+        
+    async def aclose(self):
+        """Drain queued webhooks, stop the workers and close the connection pool"""
+        if self._workers:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout=WEBHOOK_DRAIN_TIMEOUT)
+            except asyncio.TimeoutError:
+                logger.warning("Shutting down with %d webhooks still queued", self._queue.qsize())
+            for worker in self._workers:
+                worker.cancel()
+            await asyncio.gather(*self._workers, return_exceptions=True)
+            self._workers = []
+        if self._client:
+            await self._client.aclose()
+            self._client = None
+        
+    def _require_client(self) -> httpx.AsyncClient:
+        """The shared HTTP client; sending before start() is a programming error"""
+        if self._client is None:
+            raise RuntimeError("webhook service not started")
+        return self._client
+        
+    async def enqueue(self, webhook_url: str, user_id: UUID, analysis_result: MLAnalysisResult):
+        """Queue a webhook for background delivery and return immediately"""
+        await self._queue.put((webhook_url, user_id, analysis_result))
+        
+    async def _worker(self):
+        """Send queued webhooks one at a time until cancelled"""
+        while True:
+            webhook_url, user_id, analysis_result = await self._queue.get()
+            try:
+                await self.send_webhook(webhook_url, user_id, analysis_result)
+            except Exception:
+                logger.exception("Webhook worker error for %s", webhook_url)
+            finally:
+                self._queue.task_done()
         
     async def send_webhook(self, 
                           webhook_url: str, 
@@ -32,74 +196,128 @@ class WebhookService:
         Returns:
             bool: True if webhook was sent successfully, False otherwise
         """
-        
+        self._require_client()
+        body, request_headers = self._prepare(user_id, analysis_result, headers)
+        return await self._deliver(webhook_url, user_id, body, request_headers)
+    
+    def _prepare(self, user_id: UUID, analysis_result: MLAnalysisResult,
+                 headers: Optional[Dict[str, str]] = None) -> Tuple[bytes, Dict[str, str]]:
+        """Serialize and sign a webhook payload once for any number of sends"""
         # Prepare webhook payload
         payload = WebhookPayload(
             user_id=user_id,
             analysis_result=analysis_result,
-            timestamp=datetime.utcnow()
+            timestamp=datetime.now(timezone.utc)
         )
         
-        # Default headers
-        default_headers = {
-            "Content-Type": "application/json",
-            "User-Agent": "TransactionRiskAnalytics/1.0",
-            "X-Webhook-Source": "transaction-risk-api"
-        }
+        # Serialize once; every retry sends the same body
+        # (orjson encodes the UUID and datetime fields natively)
+        body = orjson.dumps(payload.model_dump(), option=orjson.OPT_UTC_Z)
         
-        # Add custom headers if provided
-        if headers:
-            default_headers.update(headers)
+        request_headers = self._base_headers
+        if headers or self._secret:
+            # Add custom headers if provided
+            request_headers = {**self._base_headers, **(headers or {})}
+            
+            # Sign the body if a webhook secret is configured, so the secret
+            # itself never goes over the wire
+            if self._secret:
+                signature = hmac.new(self._secret, body, hashlib.sha256).hexdigest()
+                request_headers["X-Webhook-Signature"] = f"sha256={signature}"
         
-        # Add authentication header if webhook secret is configured
-        webhook_secret = os.getenv("WEBHOOK_SECRET")
-        if webhook_secret:
-            default_headers["X-Webhook-Secret"] = webhook_secret
+        return body, request_headers
+    
+    async def _deliver(self, webhook_url: str, user_id: UUID,
+                       body: bytes, request_headers: Dict[str, str]) -> bool:
+        """POST a prepared body to one URL, retrying as configured"""
+        client = self._require_client()
+        limiter = self._limiter_for(httpx.URL(webhook_url).host) if self.rate_limit > 0 else None
         
         # Attempt to send webhook with retries
         for attempt in range(self.max_retries):
+            retry_after = None
             try:
-                async with httpx.AsyncClient(timeout=self.timeout) as client:
-                    response = await client.post(
-                        webhook_url,
-                        json=payload.dict(),
-                        headers=default_headers
-                    )
+                if limiter:
+                    await limiter.acquire()
+                # Stream the response: only the status matters, so the body is
+                # drained chunk by chunk (keeping the connection reusable)
+                # instead of being buffered in memory
+                async with client.stream(
+                    "POST",
+                    webhook_url,
+                    content=body,
+                    headers=request_headers
+                ) as response:
+                    async for _ in response.aiter_raw():
+                        pass
                     
                     # Check if request was successful
                     response.raise_for_status()
-                    
-                    print(f"✅ Webhook sent successfully to {webhook_url} for user {user_id}")
-                    print(f"📊 Response status: {response.status_code}")
-                    
-                    return True
-                    
+                
+                logger.info("Webhook sent successfully to %s for user %s (status %s)",
+                            webhook_url, user_id, response.status_code)
+                
+                return True
+                
             except httpx.TimeoutException:
-                print(f"⏰ Webhook timeout (attempt {attempt + 1}/{self.max_retries}): {webhook_url}")
+                logger.warning("Webhook timeout (attempt %d/%d): %s",
+                               attempt + 1, self.max_retries, webhook_url)
                 
             except httpx.HTTPStatusError as e:
-                print(f"❌ Webhook HTTP error (attempt {attempt + 1}/{self.max_retries}): {e.response.status_code} - {webhook_url}")
+                logger.warning("Webhook HTTP error (attempt %d/%d): %s - %s",
+                               attempt + 1, self.max_retries, e.response.status_code, webhook_url)
                 
-                # Don't retry for client errors (4xx)
-                if 400 <= e.response.status_code < 500:
-                    print(f"🚫 Client error, not retrying: {e.response.status_code}")
+                # Rate limited or temporarily unavailable: wait as long as asked
+                if e.response.status_code in (429, 503):
+                    retry_after = self._retry_after(e.response)
+                # Don't retry for other client errors (4xx)
+                elif 400 <= e.response.status_code < 500:
+                    logger.warning("Client error, not retrying: %s", e.response.status_code)
                     return False
                     
             except httpx.RequestError as e:
-                print(f"🌐 Webhook request error (attempt {attempt + 1}/{self.max_retries}): {e} - {webhook_url}")
+                logger.warning("Webhook request error (attempt %d/%d): %s - %s",
+                               attempt + 1, self.max_retries, e, webhook_url)
                 
-            except Exception as e:
-                print(f"💥 Unexpected webhook error (attempt {attempt + 1}/{self.max_retries}): {e} - {webhook_url}")
+            except Exception:
+                logger.exception("Unexpected webhook error (attempt %d/%d): %s",
+                                 attempt + 1, self.max_retries, webhook_url)
             
-            # Wait before retrying (exponential backoff)
+            # Wait before retrying (exponential backoff with jitter so
+            # failing senders don't retry in lockstep)
             if attempt < self.max_retries - 1:
-                delay = self.retry_delay * (2 ** attempt)
-                print(f"⏳ Waiting {delay}s before retry...")
+                if retry_after is not None:
+                    delay = retry_after
+                else:
+                    delay = min(self.max_retry_delay, self.retry_delay * (2 ** attempt)) * (0.5 + random.random())
+                logger.debug("Waiting %.2fs before retry...", delay)
                 await asyncio.sleep(delay)
         
-        print(f"❌ Failed to send webhook after {self.max_retries} attempts: {webhook_url}")
+        logger.error("Failed to send webhook after %d attempts: %s", self.max_retries, webhook_url)
         return False
     
+    def _limiter_for(self, host: str) -> _TokenBucket:
+        """Get the token bucket for a host, evicting the least recently used past the cap"""
+        limiter = self._limiters.get(host)
+        if limiter is None:
+            limiter = self._limiters[host] = _TokenBucket(self.rate_limit)
+            if len(self._limiters) > WEBHOOK_MAX_LIMITERS:
+                self._limiters.popitem(last=False)
+        else:
+            self._limiters.move_to_end(host)
+        return limiter
+    
+    def _retry_after(self, response: httpx.Response) -> Optional[float]:
+        """Seconds to wait from a Retry-After header, capped at max_retry_delay"""
+        value = response.headers.get("Retry-After")
+        if value is None:
+            return None
+        try:
+            return min(self.max_retry_delay, max(0.0, float(value)))
+        except ValueError:
+            # HTTP-date form; fall back to the normal backoff
+            return None
+    
     async def send_multiple_webhooks(self, 
                                    webhook_urls: list[str], 
                                    user_id: UUID, 
@@ -116,25 +334,30 @@ class WebhookService:
             Dict[str, bool]: Dictionary mapping URLs to success status
         """
         
-        # Create tasks for concurrent webhook sending
-        tasks = []
-        for url in webhook_urls:
-            task = asyncio.create_task(
-                self.send_webhook(url, user_id, analysis_result)
-            )
-            tasks.append((url, task))
+        self._require_client()
         
-        # Wait for all webhooks to complete
-        results = {}
-        for url, task in tasks:
-            try:
-                success = await task
-                results[url] = success
-            except Exception as e:
-                print(f"💥 Task error for {url}: {e}")
-                results[url] = False
+        # Created here rather than in __init__ so it binds to the running loop
+        if self._sem is None:
+            self._sem = asyncio.Semaphore(self.concurrency)
         
-        return results
+        # Every URL gets the same bytes, so serialize and sign just once
+        body, request_headers = self._prepare(user_id, analysis_result)
+        
+        # Send concurrently, at most self.concurrency at a time
+        coros = [self._guarded_send(url, user_id, body, request_headers) for url in webhook_urls]
+        results = await asyncio.gather(*coros, return_exceptions=True)
+        
+        for url, result in zip(webhook_urls, results):
+            if isinstance(result, BaseException):
+                logger.error("Task error for %s", url, exc_info=result)
+        
+        return {url: result is True for url, result in zip(webhook_urls, results)}
+    
+    async def _guarded_send(self, url: str, user_id: UUID,
+                            body: bytes, request_headers: Dict[str, str]) -> bool:
+        """Send one prepared webhook while holding a fanout semaphore slot"""
+        async with self._sem:
+            return await self._deliver(url, user_id, body, request_headers)
     
     async def validate_webhook_url(self, webhook_url: str) -> bool:
         """
@@ -146,17 +369,30 @@ class WebhookService:
         Returns:
             bool: True if URL is reachable, False otherwise
         """
+        client = self._require_client()
+        cached = self._validation_cache.get(webhook_url)
+        if cached is not None:
+            if time.monotonic() - cached[0] < VALIDATION_CACHE_TTL:
+                self._validation_cache.move_to_end(webhook_url)
+                return cached[1]
+            del self._validation_cache[webhook_url]
+        
         try:
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                # Send a HEAD request to check if URL is reachable
-                response = await client.head(webhook_url)
-                
-                # Accept any response that's not a connection error
-                return response.status_code < 500
+            # Send a HEAD request to check if URL is reachable
+            response = await client.head(webhook_url, timeout=10.0)
+            
+            # Accept any response that's not a connection error
+            ok = response.status_code < 500
                 
         except Exception as e:
-            print(f"🔍 Webhook URL validation failed for {webhook_url}: {e}")
-            return False
+            logger.info("Webhook URL validation failed for %s: %s", webhook_url, e)
+            ok = False
+        
+        self._validation_cache[webhook_url] = (time.monotonic(), ok)
+        self._validation_cache.move_to_end(webhook_url)
+        if len(self._validation_cache) > WEBHOOK_MAX_VALIDATIONS:
+            self._validation_cache.popitem(last=False)
+        return ok
     
     def create_test_payload(self, user_id: UUID) -> WebhookPayload:
         """
@@ -168,47 +404,9 @@ class WebhookService:
         Returns:
             WebhookPayload: Test payload
         """
-        from models.schemas import (
-            MLAnalysisResult, FinancialSummary, BehavioralAnalysis, 
-            BehavioralPatterns, RiskAssessmentDetails, RiskCategory, SpendingStability
-        )
-        
-        # Create test analysis result
-        test_result = MLAnalysisResult(
-            overall_risk_score=45.5,
-            risk_category=RiskCategory.MEDIUM,
-            loan_eligibility=True,
-            eligibility_reason="Test eligibility assessment",
-            financial_summary=FinancialSummary(
-                monthly_spendings={"2024-01": 5000.0, "2024-02": 4800.0},
-                monthly_savings={"2024-01": 2000.0, "2024-02": 2200.0},
-                total_savings=4200.0,
-                income_volatility=0.15,
-                spending_volatility=0.20,
-                consistency_score=0.85,
-                transaction_frequency=120
-            ),
-            behavioral_analysis=BehavioralAnalysis(
-                spending_pattern_distribution={"groceries": 0.3, "utilities": 0.2, "entertainment": 0.1},
-                income_and_spending_analysis={"2024-01": {"income": 7000.0, "spending": 5000.0, "savings_rate": 0.29}},
-                spending_stability=SpendingStability.HIGH,
-                behavioral_patterns=BehavioralPatterns(
-                    essential_spending_ratio=0.65,
-                    high_risk_spending_ratio=0.08,
-                    weekend_spending_ratio=0.25
-                )
-            ),
-            risk_assessment_details=RiskAssessmentDetails(
-                risk_essential_spending=20.5,
-                high_risk_spending=8.0,
-                weekend_spending=12.5,
-                loan_eligibility_factors=["Stable income", "Low risk spending"]
-            ),
-            created_at=datetime.utcnow()
-        )
-        
+        now = datetime.now(timezone.utc)
         return WebhookPayload(
             user_id=user_id,
-            analysis_result=test_result,
-            timestamp=datetime.utcnow()
+            analysis_result=_TEMPLATE_RESULT.model_copy(update={"created_at": now}),
+            timestamp=now
         )
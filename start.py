@@ -4,6 +4,7 @@ Quick start script for Transaction Risk Analytics API
 This script helps users get started quickly by checking dependencies and starting the server
 """
 
+import hashlib
 import os
 import sys
 import subprocess
@@ -40,14 +41,16 @@ def check_env_file():
     
     # Check for required variables
     required_vars = ["SUPABASE_URL", "SUPABASE_KEY"]
-    missing_vars = []
     
     try:
-        with open(env_path, 'r') as f:
-            content = f.read()
-            for var in required_vars:
-                if f"{var}=" not in content or f"{var}=your-" in content:
-                    missing_vars.append(var)
+        # Parse once so comments and quoting are handled properly
+        # (imported here since python-dotenv comes from requirements.txt)
+        from dotenv import dotenv_values
+        config = dotenv_values(env_path)
+        missing_vars = [
+            var for var in required_vars
+            if not config.get(var) or config[var].startswith("your-")
+        ]
         
         if missing_vars:
             print(f"⚠️  Missing or unconfigured environment variables: {', '.join(missing_vars)}")
@@ -68,10 +71,18 @@ def install_dependencies():
     
     try:
         # Check if requirements.txt exists
-        if not Path("requirements.txt").exists():
+        requirements = Path("requirements.txt")
+        if not requirements.exists():
             print("❌ requirements.txt not found")
             return False
         
+        # Skip pip when this environment already has these exact requirements
+        digest = hashlib.sha256(requirements.read_bytes()).hexdigest()
+        stamp = Path(sys.prefix) / ".deps.sha256"
+        if stamp.exists() and stamp.read_text().strip() == digest:
+            print("✅ Dependencies already up to date")
+            return True
+        
         # Install dependencies
         result = subprocess.run([
             sys.executable, "-m", "pip", "install", "-r", "requirements.txt"
@@ -79,6 +90,11 @@ def install_dependencies():
         
         if result.returncode == 0:
             print("✅ Dependencies installed successfully")
+            try:
+                stamp.write_text(digest)
+            except OSError:
+                # Read-only environment; we'll just reinstall next time
+                pass
             return True
         else:
             print(f"❌ Failed to install dependencies: {result.stderr}")
@@ -122,16 +138,18 @@ def start_server():
         print(f"📖 ReDoc will be available at http://{host}:{port}/redoc")
         print("\nPress Ctrl+C to stop the server\n")
         
-        # Start the server
-        subprocess.run([
+        # Replace this process with uvicorn (uvloop + httptools, no --reload so
+        # workers apply); signals then go straight to the server
+        sys.stdout.flush()
+        os.execvp(sys.executable, [
             sys.executable, "-m", "uvicorn", "app:app",
             "--host", host,
             "--port", port,
-            "--reload"
+            "--loop", "uvloop",
+            "--http", "httptools",
+            "--workers", os.getenv("WEB_CONCURRENCY", "1")
         ])
         
-    except KeyboardInterrupt:
-        print("\n🛑 Server stopped by user")
     except Exception as e:
         print(f"❌ Error starting server: {e}")
 
@@ -145,9 +163,6 @@ def main():
     if not check_python_version():
         sys.exit(1)
     
-    # Check environment configuration
-    env_ok = check_env_file()
-    
     # Install dependencies
     deps_ok = install_dependencies()
     if not deps_ok:
@@ -155,12 +170,16 @@ def main():
         print("   pip install -r requirements.txt")
         sys.exit(1)
     
-    # Run tests
-    print("\n" + "=" * 50)
-    tests_ok = run_tests()
+    # Check environment configuration
+    env_ok = check_env_file()
     
-    if not tests_ok:
-        print("\n⚠️  Some tests failed, but you can still try to start the server")
+    # Run tests only when asked to
+    if "--with-tests" in sys.argv[1:]:
+        print("\n" + "=" * 50)
+        tests_ok = run_tests()
+        
+        if not tests_ok:
+            print("\n⚠️  Some tests failed, but you can still try to start the server")
     
     if not env_ok:
         print("\n⚠️  Environment not fully configured. Please update .env file before starting.")
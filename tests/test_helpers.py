@@ -0,0 +1,14 @@
+from utils.helpers import create_monthly_trend_data
+
+
+def test_monthly_trend_savings_rate_rounds_like_python_round():
+    trend = create_monthly_trend_data({
+        "2024-01": {"income": 2000, "spending": 7},
+        "2024-02": {"income": 2000.0, "spending": 49.0},
+        "2024-03": {"income": 0, "spending": 150.0},
+        "2024-04": {"spending": 10.0},
+    })
+
+    assert trend["months"] == ["2024-01", "2024-02", "2024-03", "2024-04"]
+    assert trend["savings_rate"] == [99.7, 97.5, 0, 0]
+    assert trend["savings"] == [1993.0, 1951.0, -150.0, -10.0]
@@ -1,45 +1,92 @@
 import pandas as pd
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, NamedTuple
 from datetime import datetime, timedelta
 from collections import defaultdict
 import calendar
+import functools
 
-from models.schemas import Transaction, MLAnalysisResult, FinancialSummary, BehavioralAnalysis, BehavioralPatterns, RiskAssessmentDetails, RiskCategory, SpendingStability
+from models.schemas import Transactions, MLAnalysisResult, FinancialSummary, BehavioralAnalysis, BehavioralPatterns, RiskAssessmentDetails, RiskCategory, SpendingStability
+from utils._kernels import aggregate
+
+
+# Small synthetic history used to warm up the analysis pipeline at startup.
+# Covers credits and debits across two months, essential and high-risk
+# categories, and weekday and weekend dates.
+WARMUP_TRANSACTIONS = [
+    {"date": "2024-01-05T10:00:00Z", "amount": 50000.0, "type": "credit", "category": "salary"},
+    {"date": "2024-01-06T12:00:00Z", "amount": 1500.0, "type": "debit", "category": "groceries"},
+    {"date": "2024-01-09T18:30:00Z", "amount": 12000.0, "type": "debit", "category": "rent"},
+    {"date": "2024-01-13T22:00:00Z", "amount": 800.0, "type": "debit", "category": "nightlife"},
+    {"date": "2024-02-05T10:00:00Z", "amount": 50000.0, "type": "credit", "category": "salary"},
+    {"date": "2024-02-07T09:15:00Z", "amount": 2000.0, "type": "debit", "category": "utilities"},
+    {"date": "2024-02-10T20:00:00Z", "amount": 1200.0, "type": "debit", "category": "gaming"},
+]
+
+
+@functools.lru_cache(maxsize=1024)
+def _category_mask(categories: Tuple[str, ...], selected: frozenset) -> np.ndarray:
+    """Bool mask over `categories` marking members of `selected`, indexed by category code"""
+    mask = np.fromiter((category in selected for category in categories), dtype=bool, count=len(categories))
+    mask.flags.writeable = False
+    return mask
+
+
+class _Aggregates(NamedTuple):
+    """Every sum the calculators need, produced once per analysis and passed to each of them"""
+    months: pd.Index
+    income: np.ndarray  # credit total per month, 0 where a month had none
+    spending: np.ndarray  # debit total per month, 0 where a month had none
+    savings_rate: np.ndarray  # (income - spending) / income per month
+    avg_savings_rate: float
+    debit_months: np.ndarray  # debit totals of only the months that had any debit
+    categories: pd.Index
+    category_totals: np.ndarray  # debit total per category code
+    category_counts: np.ndarray  # debit count per category code
+    total_debit: float
+    essential_debit: float
+    high_risk_debit: float
+    weekend_debit: float
 
 
 class TransactionRiskModel:
     def __init__(self):
         # Risk categories for spending
-        self.high_risk_categories = {
+        self.high_risk_categories = frozenset({
             'gambling', 'casino', 'betting', 'alcohol', 'tobacco', 'luxury', 
             'entertainment', 'gaming', 'nightlife', 'party'
-        }
+        })
         
-        self.essential_categories = {
+        self.essential_categories = frozenset({
             'groceries', 'utilities', 'rent', 'mortgage', 'insurance', 'healthcare', 
             'medicine', 'fuel', 'transport', 'education', 'bills'
-        }
+        })
         
         # Weekend days
         self.weekend_days = [5, 6]  # Saturday, Sunday
 
-    def analyze_transactions(self, transactions: List[Transaction]) -> MLAnalysisResult:
-        """Main method to analyze transactions and generate risk assessment"""
+    def analyze_transactions(self, transactions: List[Dict[str, Any]]) -> MLAnalysisResult:
+        """Main method to analyze transactions and generate risk assessment
+
+        `transactions` are raw transaction rows as returned by Supabase.
+        """
         if not transactions:
             return self._generate_empty_result()
         
-        # Convert to DataFrame for easier analysis
-        df = self._transactions_to_dataframe(transactions)
+        # Convert to column arrays, then DataFrame for easier analysis
+        df = self._transactions_to_dataframe(Transactions.from_rows(transactions))
+        
+        # Monthly, per-category and ratio sums, shared by every calculator below
+        aggregates = self._aggregate(df)
         
         # Calculate all metrics
-        financial_summary = self._calculate_financial_summary(df)
-        behavioral_analysis = self._calculate_behavioral_analysis(df)
-        risk_assessment = self._calculate_risk_assessment(df, behavioral_analysis)
+        financial_summary = self._calculate_financial_summary(df, aggregates)
+        behavioral_analysis = self._calculate_behavioral_analysis(df, aggregates)
+        risk_assessment = self._calculate_risk_assessment(df, aggregates, behavioral_analysis)
         
         # Calculate overall risk score
         overall_risk_score = self._calculate_overall_risk_score(
-            financial_summary, behavioral_analysis, risk_assessment
+            financial_summary, behavioral_analysis, risk_assessment, aggregates.avg_savings_rate
         )
         
         # Determine risk category
@@ -47,7 +94,7 @@ class TransactionRiskModel:
         
         # Determine loan eligibility
         loan_eligibility, eligibility_reason = self._determine_loan_eligibility(
-            overall_risk_score, financial_summary, behavioral_analysis
+            overall_risk_score, financial_summary, behavioral_analysis, aggregates.avg_savings_rate
         )
         
         return MLAnalysisResult(
@@ -61,109 +108,126 @@ class TransactionRiskModel:
             created_at=datetime.utcnow()
         )
 
-    def _transactions_to_dataframe(self, transactions: List[Transaction]) -> pd.DataFrame:
-        """Convert transactions to pandas DataFrame"""
-        data = []
-        for transaction in transactions:
-            data.append({
-                'date': transaction.date,
-                'amount': transaction.amount,
-                'type': transaction.type.value,
-                'category': transaction.category.lower(),
-                'description': transaction.description,
-                'upi_app': transaction.upi_app,
-                'weekday': transaction.date.weekday(),
-                'month': transaction.date.strftime('%Y-%m'),
-                'is_weekend': transaction.date.weekday() in self.weekend_days
-            })
-        
-        df = pd.DataFrame(data)
-        df['date'] = pd.to_datetime(df['date'])
-        return df.sort_values('date')
+    def _transactions_to_dataframe(self, transactions: Transactions) -> pd.DataFrame:
+        """Build the analysis DataFrame directly from the column arrays"""
+        # 1970-01-01 was a Thursday. Day numbers fit in int8, which keeps the
+        # isin() scan below small; amounts stay float64
+        weekday = ((transactions.dates // 86400 + 3) % 7).astype(np.int8)
+        
+        # Months since 1970-01 as int32 codes; labels are only formatted for
+        # the distinct months in _aggregate
+        month_code = transactions.dates.astype('datetime64[s]').astype('datetime64[M]').view('int64').astype(np.int32)
+        
+        # Only the columns _aggregate reads. Rows stay in input order; every
+        # aggregate below is order-independent
+        return pd.DataFrame({
+            'amount': transactions.amounts,
+            'is_credit': transactions.is_credit,
+            'category': pd.Categorical.from_codes(transactions.category_codes, transactions.categories),
+            'month_code': month_code,
+            'is_weekend': np.isin(weekday, self.weekend_days)
+        })
+
+    def _aggregate(self, df: pd.DataFrame) -> _Aggregates:
+        """Compute all monthly and spending sums with one fused kernel pass"""
+        month_codes, month_values = pd.factorize(df['month_code'], sort=True)
+        months = pd.Index(np.datetime_as_string(month_values.to_numpy().astype('datetime64[M]'), unit='M'))
+        categories = df['category'].cat.categories
+        # Users tend to reuse the same category lists, so the masks are cached
+        category_key = tuple(categories)
+        
+        (monthly_totals, monthly_counts, category_totals, category_counts,
+         total_debit, essential_debit, high_risk_debit, weekend_debit) = aggregate(
+            df['amount'].to_numpy(),
+            df['is_credit'].to_numpy(),
+            month_codes,
+            df['category'].cat.codes.to_numpy(),
+            df['is_weekend'].to_numpy(),
+            len(months),
+            len(categories),
+            _category_mask(category_key, self.essential_categories),
+            _category_mask(category_key, self.high_risk_categories)
+        )
+        # Columns of the (n_months, 2) table; months without a type count as 0
+        income = monthly_totals[:, 1]
+        spending = monthly_totals[:, 0]
+        savings_rate = (income - spending) / (income + 1e-6)
+        
+        return _Aggregates(
+            months=months,
+            income=income,
+            spending=spending,
+            savings_rate=savings_rate,
+            avg_savings_rate=savings_rate.mean(),
+            debit_months=spending[monthly_counts[:, 0] > 0],
+            categories=categories,
+            category_totals=category_totals,
+            category_counts=category_counts,
+            total_debit=total_debit,
+            essential_debit=essential_debit,
+            high_risk_debit=high_risk_debit,
+            weekend_debit=weekend_debit
+        )
 
-    def _calculate_financial_summary(self, df: pd.DataFrame) -> FinancialSummary:
+    def _calculate_financial_summary(self, df: pd.DataFrame, aggregates: _Aggregates) -> FinancialSummary:
         """Calculate financial summary metrics"""
-        # Monthly spending and income
-        monthly_data = df.groupby(['month', 'type'])['amount'].sum().unstack(fill_value=0)
-        
-        monthly_spendings = {}
-        monthly_savings = {}
-        
-        for month in monthly_data.index:
-            spending = monthly_data.loc[month, 'debit'] if 'debit' in monthly_data.columns else 0
-            income = monthly_data.loc[month, 'credit'] if 'credit' in monthly_data.columns else 0
-            
-            monthly_spendings[month] = float(spending)
-            monthly_savings[month] = float(max(0, income - spending))
+        # Monthly spending and income; months without a type count as 0
+        months = aggregates.months
+        spending_arr = aggregates.spending
+        income_arr = aggregates.income
+        savings_arr = np.maximum(income_arr - spending_arr, 0)
         
         # Calculate volatilities
-        spending_values = list(monthly_spendings.values())
-        income_values = [monthly_data.loc[month, 'credit'] if 'credit' in monthly_data.columns else 0 
-                        for month in monthly_data.index]
-        
-        income_volatility = np.std(income_values) / (np.mean(income_values) + 1e-6)
-        spending_volatility = np.std(spending_values) / (np.mean(spending_values) + 1e-6)
+        income_volatility = income_arr.std() / (income_arr.mean() + 1e-6)
+        spending_volatility = spending_arr.std() / (spending_arr.mean() + 1e-6)
         
         # Consistency score (inverse of combined volatility)
         consistency_score = max(0, 1 - (income_volatility + spending_volatility) / 2)
         
         return FinancialSummary(
-            monthly_spendings=monthly_spendings,
-            monthly_savings=monthly_savings,
-            total_savings=sum(monthly_savings.values()),
+            monthly_spendings=dict(zip(months, spending_arr.tolist())),
+            monthly_savings=dict(zip(months, savings_arr.tolist())),
+            total_savings=float(savings_arr.sum()),
             income_volatility=round(income_volatility, 3),
             spending_volatility=round(spending_volatility, 3),
             consistency_score=round(consistency_score, 3),
             transaction_frequency=len(df)
         )
 
-    def _calculate_behavioral_analysis(self, df: pd.DataFrame) -> BehavioralAnalysis:
+    def _calculate_behavioral_analysis(self, df: pd.DataFrame, aggregates: _Aggregates) -> BehavioralAnalysis:
         """Calculate behavioral analysis metrics"""
         # Spending pattern distribution by category
-        spending_by_category = df[df['type'] == 'debit'].groupby('category')['amount'].sum()
-        total_spending = spending_by_category.sum()
+        spent_in = aggregates.category_counts > 0
+        category_totals = aggregates.category_totals[spent_in]
+        total_spending = category_totals.sum()
         
         spending_pattern_distribution = {}
         if total_spending > 0:
             spending_pattern_distribution = {
                 category: round(float(amount / total_spending), 3)
-                for category, amount in spending_by_category.items()
+                for category, amount in zip(aggregates.categories[spent_in], category_totals)
             }
         
         # Income and spending analysis by month
-        monthly_analysis = df.groupby(['month', 'type'])['amount'].sum().unstack(fill_value=0)
         income_spending_analysis = {}
         
-        for month in monthly_analysis.index:
-            income = monthly_analysis.loc[month, 'credit'] if 'credit' in monthly_analysis.columns else 0
-            spending = monthly_analysis.loc[month, 'debit'] if 'debit' in monthly_analysis.columns else 0
-            
+        for month, income, spending, savings_rate in zip(
+            aggregates.months, aggregates.income.tolist(),
+            aggregates.spending.tolist(), aggregates.savings_rate.tolist()
+        ):
             income_spending_analysis[month] = {
-                'income': float(income),
-                'spending': float(spending),
-                'savings_rate': float((income - spending) / (income + 1e-6))
+                'income': income,
+                'spending': spending,
+                'savings_rate': savings_rate
             }
         
         # Calculate behavioral patterns
-        debit_transactions = df[df['type'] == 'debit']
-        total_debit_amount = debit_transactions['amount'].sum()
+        total_debit_amount = aggregates.total_debit
         
         if total_debit_amount > 0:
-            # Essential spending ratio
-            essential_spending = debit_transactions[
-                debit_transactions['category'].isin(self.essential_categories)
-            ]['amount'].sum()
-            essential_ratio = essential_spending / total_debit_amount
-            
-            # High-risk spending ratio
-            high_risk_spending = debit_transactions[
-                debit_transactions['category'].isin(self.high_risk_categories)
-            ]['amount'].sum()
-            high_risk_ratio = high_risk_spending / total_debit_amount
-            
-            # Weekend spending ratio
-            weekend_spending = debit_transactions[debit_transactions['is_weekend']]['amount'].sum()
-            weekend_ratio = weekend_spending / total_debit_amount
+            essential_ratio = aggregates.essential_debit / total_debit_amount
+            high_risk_ratio = aggregates.high_risk_debit / total_debit_amount
+            weekend_ratio = aggregates.weekend_debit / total_debit_amount
         else:
             essential_ratio = high_risk_ratio = weekend_ratio = 0
         
@@ -174,7 +238,7 @@ class TransactionRiskModel:
         )
         
         # Determine spending stability
-        spending_stability = self._determine_spending_stability(df)
+        spending_stability = self._determine_spending_stability(aggregates.debit_months)
         
         return BehavioralAnalysis(
             spending_pattern_distribution=spending_pattern_distribution,
@@ -183,7 +247,8 @@ class TransactionRiskModel:
             behavioral_patterns=behavioral_patterns
         )
 
-    def _calculate_risk_assessment(self, df: pd.DataFrame, behavioral_analysis: BehavioralAnalysis) -> RiskAssessmentDetails:
+    def _calculate_risk_assessment(self, df: pd.DataFrame, aggregates: _Aggregates,
+                                   behavioral_analysis: BehavioralAnalysis) -> RiskAssessmentDetails:
         """Calculate detailed risk assessment"""
         patterns = behavioral_analysis.behavioral_patterns
         
@@ -204,11 +269,9 @@ class TransactionRiskModel:
         if behavioral_analysis.spending_stability in [SpendingStability.HIGH, SpendingStability.MEDIUM]:
             eligibility_factors.append("Stable spending pattern")
         
-        # Check income consistency from financial summary
-        monthly_incomes = [
-            analysis['income'] for analysis in behavioral_analysis.income_and_spending_analysis.values()
-        ]
-        if len(monthly_incomes) > 1 and np.std(monthly_incomes) / (np.mean(monthly_incomes) + 1e-6) < 0.3:
+        # Check income consistency across months
+        monthly_incomes = aggregates.income
+        if len(monthly_incomes) > 1 and monthly_incomes.std() / (monthly_incomes.mean() + 1e-6) < 0.3:
             eligibility_factors.append("Stable income")
         
         if not eligibility_factors:
@@ -221,14 +284,18 @@ class TransactionRiskModel:
             loan_eligibility_factors=eligibility_factors
         )
 
-    def _determine_spending_stability(self, df: pd.DataFrame) -> SpendingStability:
-        """Determine spending stability based on transaction patterns"""
-        monthly_spending = df[df['type'] == 'debit'].groupby('month')['amount'].sum()
+    def _determine_spending_stability(self, monthly_spending: np.ndarray) -> SpendingStability:
+        """Determine spending stability based on transaction patterns
+
+        `monthly_spending` holds only the months that had any spending.
+        """
         
         if len(monthly_spending) < 2:
             return SpendingStability.MEDIUM
         
-        cv = np.std(monthly_spending) / (np.mean(monthly_spending) + 1e-6)
+        # Population std from a single mean, rather than np.std and np.mean each taking one
+        mean = monthly_spending.mean()
+        cv = np.sqrt(((monthly_spending - mean) ** 2).mean()) / (mean + 1e-6)
         
         if cv < 0.2:
             return SpendingStability.HIGH
@@ -239,41 +306,28 @@ class TransactionRiskModel:
 
     def _calculate_overall_risk_score(self, financial_summary: FinancialSummary, 
                                     behavioral_analysis: BehavioralAnalysis,
-                                    risk_assessment: RiskAssessmentDetails) -> float:
+                                    risk_assessment: RiskAssessmentDetails,
+                                    avg_savings_rate: float) -> float:
         """Calculate overall risk score (0-100, higher = more risky)"""
+        fs = financial_summary
+        patterns = behavioral_analysis.behavioral_patterns
+        n = fs.transaction_frequency
         
-        # Base score from volatilities
-        volatility_score = (financial_summary.income_volatility + financial_summary.spending_volatility) * 50
-        
-        # Consistency bonus (lower risk for consistent behavior)
-        consistency_bonus = (1 - financial_summary.consistency_score) * 20
-        
-        # Behavioral risk factors
-        behavioral_risk = (
-            behavioral_analysis.behavioral_patterns.high_risk_spending_ratio * 30 +
-            max(0, behavioral_analysis.behavioral_patterns.weekend_spending_ratio - 0.2) * 20
-        )
-        
-        # Essential spending bonus (lower risk for essential spending)
-        essential_bonus = max(0, (0.6 - behavioral_analysis.behavioral_patterns.essential_spending_ratio) * 15)
-        
-        # Savings rate factor
-        avg_savings_rate = np.mean([
-            analysis.get('savings_rate', 0) 
-            for analysis in behavioral_analysis.income_and_spending_analysis.values()
-        ])
-        savings_risk = max(0, (0.1 - avg_savings_rate) * 25)  # Risk if savings rate < 10%
-        
-        # Transaction frequency factor (very low or very high frequency can be risky)
-        freq_risk = 0
-        if financial_summary.transaction_frequency < 20:  # Too few transactions
-            freq_risk = 10
-        elif financial_summary.transaction_frequency > 300:  # Too many transactions
-            freq_risk = 5
+        # Transaction frequency factor (too few or too many transactions can be risky)
+        freq_risk = 10 if n < 20 else (5 if n > 300 else 0)
         
         total_risk = (
-            volatility_score + consistency_bonus + behavioral_risk + 
-            essential_bonus + savings_risk + freq_risk
+            # Base score from volatilities
+            (fs.income_volatility + fs.spending_volatility) * 50
+            # Consistency bonus (lower risk for consistent behavior)
+            + (1 - fs.consistency_score) * 20
+            # Behavioral risk factors
+            + (patterns.high_risk_spending_ratio * 30 + max(0, patterns.weekend_spending_ratio - 0.2) * 20)
+            # Essential spending bonus (lower risk for essential spending)
+            + max(0, (0.6 - patterns.essential_spending_ratio) * 15)
+            # Risk if savings rate < 10%
+            + max(0, (0.1 - avg_savings_rate) * 25)
+            + freq_risk
         )
         
         return min(100, max(0, total_risk))
@@ -288,7 +342,8 @@ class TransactionRiskModel:
             return RiskCategory.HIGH
 
     def _determine_loan_eligibility(self, risk_score: float, financial_summary: FinancialSummary,
-                                  behavioral_analysis: BehavioralAnalysis) -> Tuple[bool, str]:
+                                  behavioral_analysis: BehavioralAnalysis,
+                                  avg_savings_rate: float) -> Tuple[bool, str]:
         """Determine loan eligibility and provide reasoning"""
         
         # Base eligibility on risk score
@@ -307,11 +362,6 @@ class TransactionRiskModel:
             return False, "Excessive high-risk spending indicating poor financial discipline"
         
         # Check savings capability
-        avg_savings_rate = np.mean([
-            analysis.get('savings_rate', 0) 
-            for analysis in behavioral_analysis.income_and_spending_analysis.values()
-        ])
-        
         if avg_savings_rate < -0.1:  # Consistently spending more than earning
             return False, "Negative savings rate indicating financial stress"
         
@@ -0,0 +1,129 @@
+"""Fused numeric kernels for the model and helpers
+
+`aggregate` makes one pass over the transaction arrays and returns every
+sum TransactionRiskModel needs; `zscore_anomalies` backs
+detect_spending_anomalies. Each is JIT-compiled with numba when available,
+with an equivalent NumPy implementation otherwise.
+"""
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - numba is optional at runtime
+    njit = None
+
+
+def _aggregate_numpy(amounts, is_credit, month_codes, category_codes, is_weekend,
+                     n_months, n_categories, essential_mask, high_risk_mask):
+    """NumPy version of `aggregate` built on np.bincount"""
+    keys = month_codes * 2 + is_credit
+    monthly_totals = np.bincount(keys, weights=amounts, minlength=2 * n_months).reshape(-1, 2)
+    monthly_counts = np.bincount(keys, minlength=2 * n_months).reshape(-1, 2)
+
+    debit = is_credit == 0
+    debit_amounts = amounts[debit]
+    debit_codes = category_codes[debit]
+    has_category = debit_codes >= 0
+    coded_amounts = debit_amounts[has_category]
+    coded = debit_codes[has_category]
+
+    category_totals = np.bincount(coded, weights=coded_amounts, minlength=n_categories)
+    category_counts = np.bincount(coded, minlength=n_categories)
+
+    return (
+        monthly_totals,
+        monthly_counts,
+        category_totals,
+        category_counts,
+        debit_amounts.sum(),
+        coded_amounts[essential_mask[coded]].sum(),
+        coded_amounts[high_risk_mask[coded]].sum(),
+        debit_amounts[is_weekend[debit]].sum(),
+    )
+
+
+def _aggregate_loop(amounts, is_credit, month_codes, category_codes, is_weekend,
+                    n_months, n_categories, essential_mask, high_risk_mask):
+    """Single-pass version of `aggregate`, compiled by numba"""
+    monthly_totals = np.zeros((n_months, 2))
+    monthly_counts = np.zeros((n_months, 2), dtype=np.int64)
+    category_totals = np.zeros(n_categories)
+    category_counts = np.zeros(n_categories, dtype=np.int64)
+    total_debit = 0.0
+    essential_debit = 0.0
+    high_risk_debit = 0.0
+    weekend_debit = 0.0
+
+    for i in range(amounts.shape[0]):
+        amount = amounts[i]
+        kind = 1 if is_credit[i] else 0
+        month = month_codes[i]
+        monthly_totals[month, kind] += amount
+        monthly_counts[month, kind] += 1
+
+        if kind == 0:
+            total_debit += amount
+            if is_weekend[i]:
+                weekend_debit += amount
+            code = category_codes[i]
+            if code >= 0:
+                category_totals[code] += amount
+                category_counts[code] += 1
+                if essential_mask[code]:
+                    essential_debit += amount
+                if high_risk_mask[code]:
+                    high_risk_debit += amount
+
+    return (monthly_totals, monthly_counts, category_totals, category_counts,
+            total_debit, essential_debit, high_risk_debit, weekend_debit)
+
+
+# aggregate(amounts, is_credit, month_codes, category_codes, is_weekend,
+#           n_months, n_categories, essential_mask, high_risk_mask)
+#
+# Arguments are parallel per-transaction arrays (is_credit 0/1, dense
+# month_codes, category_codes with -1 for missing) plus bool masks indexed
+# by category code. Returns (monthly_totals[n_months, 2],
+# monthly_counts[n_months, 2], category_totals, category_counts,
+# total_debit, essential_debit, high_risk_debit, weekend_debit); column 0
+# is debit and column 1 is credit.
+aggregate = njit(cache=True)(_aggregate_loop) if njit is not None else _aggregate_numpy
+
+
+def _zscore_anomalies_numpy(values, threshold):
+    """NumPy version of `zscore_anomalies`"""
+    std = values.std()
+    if std == 0:
+        return np.empty(0, dtype=np.int64)
+    return np.flatnonzero(np.abs((values - values.mean()) / std) > threshold)
+
+
+def _zscore_anomalies_loop(values, threshold):
+    """Mean/variance passes, then one scan collecting anomaly indexes"""
+    n = values.shape[0]
+    total = 0.0
+    for i in range(n):
+        total += values[i]
+    mean = total / n
+    m2 = 0.0
+    for i in range(n):
+        delta = values[i] - mean
+        m2 += delta * delta
+    std = np.sqrt(m2 / n)
+
+    anomalies = np.empty(n, dtype=np.int64)
+    if std == 0:
+        return anomalies[:0]
+    count = 0
+    for i in range(n):
+        if abs((values[i] - mean) / std) > threshold:
+            anomalies[count] = i
+            count += 1
+    return anomalies[:count]
+
+
+# zscore_anomalies(values, threshold) -> int64 indexes of `values` whose
+# population z-score exceeds `threshold` (empty when all values are equal)
+zscore_anomalies = (
+    njit(cache=True)(_zscore_anomalies_loop) if njit is not None else _zscore_anomalies_numpy
+)
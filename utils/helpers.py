@@ -1,11 +1,36 @@
+from bisect import bisect_right
 from datetime import datetime, timedelta
 from typing import Dict, List, Any, Optional
+import asyncio
 import json
 import base64
+import re
 from uuid import UUID
 import pandas as pd
 import numpy as np
 
+from utils._kernels import zscore_anomalies
+
+
+# Coarse UTC clock refreshed by tick_clock() while the app is running
+_cached_utcnow: Optional[datetime] = None
+
+
+def utcnow() -> datetime:
+    """Return the cached UTC time, or the exact time if the clock task isn't running"""
+    return _cached_utcnow if _cached_utcnow is not None else datetime.utcnow()
+
+
+async def tick_clock(interval: float = 0.1):
+    """Refresh the cached UTC time every `interval` seconds until cancelled"""
+    global _cached_utcnow
+    try:
+        while True:
+            _cached_utcnow = datetime.utcnow()
+            await asyncio.sleep(interval)
+    finally:
+        _cached_utcnow = None
+
 
 def serialize_datetime(obj):
     """JSON serializer for datetime objects"""
@@ -14,22 +39,30 @@ def serialize_datetime(obj):
     raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
 
 
+# Supported layouts keyed by the separators that tell them apart:
+# (has 'T', has '.', ends with 'Z', has ':'). strptime matches literals
+# case-insensitively, so the key is built from the upper-cased string
+_DATETIME_FORMATS = {
+    (True, True, True, True): "%Y-%m-%dT%H:%M:%S.%fZ",
+    (True, False, True, True): "%Y-%m-%dT%H:%M:%SZ",
+    (True, True, False, True): "%Y-%m-%dT%H:%M:%S.%f",
+    (True, False, False, True): "%Y-%m-%dT%H:%M:%S",
+    (False, False, False, True): "%Y-%m-%d %H:%M:%S",
+    (False, False, False, False): "%Y-%m-%d",
+}
+
+
 def parse_datetime_string(date_string: str) -> datetime:
     """Parse datetime string with multiple format support"""
-    formats = [
-        "%Y-%m-%dT%H:%M:%S.%fZ",
-        "%Y-%m-%dT%H:%M:%SZ",
-        "%Y-%m-%dT%H:%M:%S.%f",
-        "%Y-%m-%dT%H:%M:%S",
-        "%Y-%m-%d %H:%M:%S",
-        "%Y-%m-%d"
-    ]
-    
-    for fmt in formats:
+    upper = date_string.upper()
+    fmt = _DATETIME_FORMATS.get(
+        ("T" in upper, "." in upper, upper.endswith("Z"), ":" in upper)
+    )
+    if fmt is not None:
         try:
             return datetime.strptime(date_string, fmt)
         except ValueError:
-            continue
+            pass
     
     raise ValueError(f"Unable to parse datetime string: {date_string}")
 
@@ -53,18 +86,21 @@ def calculate_percentage_change(old_value: float, new_value: float) -> float:
     return ((new_value - old_value) / old_value) * 100
 
 
+# Upper bounds (exclusive) of each amount category, and the category names
+_AMOUNT_BINS = (100, 1000, 10000, 50000)
+_AMOUNT_LABELS = ("micro", "small", "medium", "large", "very_large")
+_AMOUNT_BINS_ARR = np.array(_AMOUNT_BINS, dtype=np.float64)
+_AMOUNT_LABELS_ARR = np.array(_AMOUNT_LABELS)
+
+
 def categorize_transaction_amount(amount: float) -> str:
     """Categorize transaction by amount range"""
-    if amount < 100:
-        return "micro"
-    elif amount < 1000:
-        return "small"
-    elif amount < 10000:
-        return "medium"
-    elif amount < 50000:
-        return "large"
-    else:
-        return "very_large"
+    return _AMOUNT_LABELS[bisect_right(_AMOUNT_BINS, amount)]
+
+
+def categorize_transaction_amounts(amounts: np.ndarray) -> np.ndarray:
+    """Categorize an array of amounts at once, matching categorize_transaction_amount"""
+    return _AMOUNT_LABELS_ARR[np.searchsorted(_AMOUNT_BINS_ARR, amounts, side="right")]
 
 
 def detect_spending_anomalies(amounts: List[float], threshold: float = 2.0) -> List[int]:
@@ -72,19 +108,8 @@ def detect_spending_anomalies(amounts: List[float], threshold: float = 2.0) -> L
     if len(amounts) < 3:
         return []
     
-    mean_amount = np.mean(amounts)
-    std_amount = np.std(amounts)
-    
-    if std_amount == 0:
-        return []
-    
-    anomalies = []
-    for i, amount in enumerate(amounts):
-        z_score = abs((amount - mean_amount) / std_amount)
-        if z_score > threshold:
-            anomalies.append(i)
-    
-    return anomalies
+    # Single compiled pass for mean/std, then one scan for the outliers
+    return zscore_anomalies(np.asarray(amounts, dtype=np.float64), float(threshold)).tolist()
 
 
 def calculate_financial_health_score(
@@ -156,66 +181,44 @@ def create_monthly_trend_data(monthly_data: Dict[str, Dict[str, float]]) -> Dict
     """Create trend data for frontend charts"""
     months = sorted(monthly_data.keys())
     
-    trend_data = {
-        "months": months,
-        "income": [],
-        "spending": [],
-        "savings": [],
-        "savings_rate": []
-    }
+    n = len(months)
+    rows = [monthly_data[month] for month in months]
+    income = np.fromiter((row.get('income', 0) for row in rows), dtype=np.float64, count=n)
+    spending = np.fromiter((row.get('spending', 0) for row in rows), dtype=np.float64, count=n)
+    savings = income - spending
     
-    for month in months:
-        data = monthly_data.get(month, {})
-        income = data.get('income', 0)
-        spending = data.get('spending', 0)
-        savings = income - spending
-        savings_rate = (savings / income * 100) if income > 0 else 0
-        
-        trend_data["income"].append(income)
-        trend_data["spending"].append(spending)
-        trend_data["savings"].append(savings)
-        trend_data["savings_rate"].append(round(savings_rate, 1))
+    # Savings rate as a percentage; 0 for months without income
+    savings_rate = np.zeros(n)
+    np.divide(savings, income, out=savings_rate, where=income > 0)
+    savings_rate *= 100
     
-    return trend_data
+    return {
+        "months": months,
+        "income": income.tolist(),
+        "spending": spending.tolist(),
+        "savings": savings.tolist(),
+        # Python's round() per value: ndarray.round scales and rints, which
+        # lands on the other side of ties like 99.65 and 97.55
+        "savings_rate": [round(rate, 1) for rate in savings_rate.tolist()]
+    }
+
+
+# Account numbers are 9-18 digits; IFSC codes are 4 letters, a literal 0
+# and 6 letters/digits. ASCII only, matched in C by the regex engine
+_ACCOUNT_NUMBER_RE = re.compile(r"[0-9]{9,18}")
+_IFSC_CODE_RE = re.compile(r"[A-Z]{4}0[A-Z0-9]{6}")
 
 
 def validate_account_number(account_no: str) -> bool:
     """Validate Indian bank account number format"""
-    # Remove spaces and convert to uppercase
-    account_no = account_no.replace(" ", "").upper()
-    
-    # Basic validation: 9-18 digits
-    if not account_no.isdigit():
-        return False
-    
-    if len(account_no) < 9 or len(account_no) > 18:
-        return False
-    
-    return True
+    # Remove spaces before matching
+    return _ACCOUNT_NUMBER_RE.fullmatch(account_no.replace(" ", "")) is not None
 
 
 def validate_ifsc_code(ifsc_code: str) -> bool:
     """Validate Indian IFSC code format"""
-    # Remove spaces and convert to uppercase
-    ifsc_code = ifsc_code.replace(" ", "").upper()
-    
-    # IFSC format: 4 letters + 7 characters (letters/digits)
-    if len(ifsc_code) != 11:
-        return False
-    
-    # First 4 characters should be letters
-    if not ifsc_code[:4].isalpha():
-        return False
-    
-    # 5th character should be 0
-    if ifsc_code[4] != '0':
-        return False
-    
-    # Last 6 characters should be alphanumeric
-    if not ifsc_code[5:].isalnum():
-        return False
-    
-    return True
+    # Remove spaces and convert to uppercase before matching
+    return _IFSC_CODE_RE.fullmatch(ifsc_code.replace(" ", "").upper()) is not None
 
 
 def safe_divide(numerator: float, denominator: float, default: float = 0.0) -> float: